@@ -1,17 +1,25 @@
 #!/usr/bin/env python3
 
+import asyncio
 import datetime
 import json
 import logging
 import math
 import os
-import random
 import re
+import select
+import selectors
+import socket
 import subprocess
-import telnetlib
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain
 
-MAX_RETRIES=60
+# the qemu connect loops sleep 0.2s between attempts, so 300 retries keeps
+# the total budget at the ~60 seconds the old 1s sleep allowed
+MAX_RETRIES=300
+TRACE_LEVEL_NUM = 9
 
 # Global list of ports that we want to set up forwarding from container IP ->
 # mgmt IP of router (usually 10.0.0.15). Each entry consists of the protocol,
@@ -29,14 +37,256 @@ def gen_mac(last_octet=None):
     """ Generate a random MAC address that is in the qemu OUI space and that
         has the given last octet.
     """
-    return "52:54:00:%02x:%02x:%02x" % (
-            random.randint(0x00, 0xff),
-            random.randint(0x00, 0xff),
-            last_octet
-        )
+    r = os.urandom(2)
+    return f"52:54:00:{r[0]:02x}:{r[1]:02x}:{last_octet:02x}"
 
 
 
+class SerialConsole:
+    """ Minimal telnet-style client for the qemu serial console and monitor
+
+        qemu's telnet server doesn't emit IAC negotiation sequences, so the
+        connection can be treated as a plain byte stream and searched with
+        C-level bytes operations instead of telnetlib's per-byte cooking
+        loop (telnetlib is also gone from Python 3.13). The interface
+        mirrors the telnetlib.Telnet subset used by the launch scripts:
+        read_until, expect, write and close.
+    """
+
+    def __init__(self, host, port):
+        self.sock = socket.create_connection((host, port))
+        self.buf = bytearray()
+        self.eof = False
+        self._iac_tail = b""
+
+    def fileno(self):
+        return self.sock.fileno()
+
+    def _strip_iac(self, data):
+        """ Remove telnet IAC command sequences from a chunk
+
+            Only called when a 0xff byte is actually present, so the normal
+            path stays a straight buffer append. Escaped data bytes
+            (IAC IAC) are kept; WILL/WONT/DO/DONT eat their option byte; a
+            sequence split across chunks is carried over to the next read.
+        """
+        out = bytearray()
+        i = 0
+        n = len(data)
+        while i < n:
+            j = data.find(b"\xff", i)
+            if j < 0:
+                out += data[i:]
+                break
+            out += data[i:j]
+            if j + 1 >= n:
+                self._iac_tail = data[j:]
+                break
+            cmd = data[j+1]
+            if cmd == 0xff:
+                # IAC IAC is an escaped literal 0xff data byte
+                out.append(0xff)
+                i = j + 2
+            elif cmd in (251, 252, 253, 254):
+                # WILL/WONT/DO/DONT carry an option byte
+                if j + 2 >= n:
+                    self._iac_tail = data[j:]
+                    break
+                i = j + 3
+            else:
+                i = j + 2
+        return bytes(out)
+
+    def _fill(self, timeout=None):
+        """ Read one chunk from the socket into the buffer
+
+            Returns False if nothing arrived within the timeout or the peer
+            has closed the connection.
+        """
+        if self.eof:
+            return False
+        if timeout is not None:
+            ready, _, _ = select.select([self.sock], [], [], timeout)
+            if not ready:
+                return False
+        data = self.sock.recv(4096)
+        if not data:
+            self.eof = True
+            return False
+        if self._iac_tail:
+            data = self._iac_tail + data
+            self._iac_tail = b""
+        if b"\xff" in data:
+            data = self._strip_iac(data)
+        self.buf += data
+        return True
+
+    def read_until(self, expected, timeout=None):
+        """ Read until the expected byte string is found
+
+            On timeout, return whatever has accumulated, just like
+            telnetlib does.
+        """
+        deadline = time.time() + timeout if timeout is not None else None
+        while True:
+            idx = self.buf.find(expected)
+            if idx >= 0:
+                idx += len(expected)
+                data = bytes(self.buf[:idx])
+                del self.buf[:idx]
+                return data
+            remaining = None
+            if deadline is not None:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+            if not self._fill(remaining):
+                break
+        data = bytes(self.buf)
+        self.buf.clear()
+        if not data and self.eof:
+            raise EOFError("telnet connection closed")
+        return data
+
+    def expect(self, patterns, timeout=None):
+        """ Read until one of the patterns matches
+
+            Returns (index, match, data) where data includes everything up
+            to and including the match. On timeout, returns (-1, None,
+            <buffered data>) and drains the buffer, mirroring telnetlib.
+        """
+        patterns = [p if hasattr(p, "search") else re.compile(p)
+                    for p in patterns]
+        deadline = time.time() + timeout if timeout is not None else None
+        while True:
+            data = bytes(self.buf)
+            for i, pattern in enumerate(patterns):
+                m = pattern.search(data)
+                if m:
+                    e = m.end()
+                    del self.buf[:e]
+                    return (i, m, data[:e])
+            remaining = None
+            if deadline is not None:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+            if not self._fill(remaining):
+                break
+        data = bytes(self.buf)
+        self.buf.clear()
+        if not data and self.eof:
+            raise EOFError("telnet connection closed")
+        return (-1, None, data)
+
+    def write(self, data):
+        self.sock.sendall(data)
+
+    def close(self):
+        self.sock.close()
+
+
+class PortForwarder:
+    """ In-process replacement for the socat port forwarders
+
+        Forwards ports on the container IP to the qemu user-mode hostfwd
+        ports on localhost. TCP ports get an asyncio server each and UDP
+        ports (SNMP) a datagram relay, all driven by one event loop in a
+        daemon thread, instead of one forked socat process per port.
+    """
+
+    def __init__(self, fwds, src_offset=0, dst_offset=2000):
+        self.logger = logging.getLogger()
+        self.fwds = fwds
+        self.src_offset = src_offset
+        self.dst_offset = dst_offset
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        for proto, src_port, dst_port in self.fwds:
+            src = src_port + self.src_offset
+            dst = dst_port + self.dst_offset
+            try:
+                if proto == 'tcp':
+                    self.loop.run_until_complete(asyncio.start_server(
+                        lambda r, w, dst=dst: self._handle_tcp(r, w, dst),
+                        "0.0.0.0", src))
+                else:
+                    self.loop.run_until_complete(
+                        self.loop.create_datagram_endpoint(
+                            lambda dst=dst: _UdpRelay(self.loop, dst),
+                            local_addr=("0.0.0.0", src)))
+            except OSError as exc:
+                self.logger.warning("unable to forward port %d: %s", src, exc)
+        self.loop.run_forever()
+
+    async def _handle_tcp(self, reader, writer, dst_port):
+        try:
+            up_reader, up_writer = await asyncio.open_connection(
+                "127.0.0.1", dst_port)
+        except OSError as exc:
+            self.logger.warning("unable to connect to 127.0.0.1:%d: %s",
+                                dst_port, exc)
+            writer.close()
+            return
+        await asyncio.gather(self._pump(reader, up_writer),
+                             self._pump(up_reader, writer))
+
+    async def _pump(self, reader, writer):
+        try:
+            while True:
+                data = await reader.read(65536)
+                if not data:
+                    break
+                writer.write(data)
+                await writer.drain()
+        except OSError:
+            pass
+        finally:
+            writer.close()
+
+
+class _UdpRelay(asyncio.DatagramProtocol):
+    """ Relay datagrams to a local port, keeping one upstream socket per
+        client so that replies find their way back to the right peer
+    """
+
+    def __init__(self, loop, dst_port):
+        self.loop = loop
+        self.dst_port = dst_port
+        self.transport = None
+        self.peers = {}
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        peer = self.peers.get(addr)
+        if peer is not None:
+            peer.sendto(data)
+        else:
+            self.loop.create_task(self._new_peer(data, addr))
+
+    async def _new_peer(self, data, addr):
+        transport, _ = await self.loop.create_datagram_endpoint(
+            lambda: _UdpUpstream(self.transport, addr),
+            remote_addr=("127.0.0.1", self.dst_port))
+        self.peers[addr] = transport
+        transport.sendto(data)
+
+
+class _UdpUpstream(asyncio.DatagramProtocol):
+    def __init__(self, listener, addr):
+        self.listener = listener
+        self.addr = addr
+
+    def datagram_received(self, data, addr):
+        self.listener.sendto(data, self.addr)
+
+
 def run_command(cmd, cwd=None, background=False):
     res = None
     try:
@@ -45,7 +295,7 @@ def run_command(cmd, cwd=None, background=False):
         else:
             p = subprocess.Popen(cmd, stdout=subprocess.PIPE, cwd=cwd)
             res = p.communicate()
-    except:
+    except (FileNotFoundError, subprocess.SubprocessError):
         pass
     return res
 
@@ -71,6 +321,7 @@ class VM:
         self.running = False
         self.spins = 0
         self.p = None
+        self.pidfd = None
         self.tn = None
         self.qm = None
 
@@ -81,6 +332,15 @@ class VM:
         self.num_nics = 0
         self.nics_per_pci_bus = 26 # tested to work with XRv
         self.smbios = []
+        # NIC qemu args are generated on first start() and cached so that a
+        # restarted VM keeps its MAC addresses
+        self._mgmt_args = None
+        self._nic_args = None
+        # selector supervising our qemu process (set by register_events) and
+        # a counter of how many times qemu has been started, used to detect
+        # events that belong to an earlier incarnation of the process
+        self._selector = None
+        self._starts = 0
 
         self.qemu_args = ["qemu-system-x86_64", "-display", "none", "-machine", "pc" ]
         self.qemu_args.extend(["-monitor", "tcp:0.0.0.0:40%02d,server,nowait" % self.num])
@@ -88,14 +348,21 @@ class VM:
                                "-serial", "telnet:0.0.0.0:50%02d,server,nowait" % self.num])
         self.pre_start_cmds, overlay_qemu_args = self.create_overlay_image()
         self.qemu_args.extend(overlay_qemu_args)
-        # enable hardware assist if KVM is available
+        # enable hardware assist if KVM is available, and expose the host CPU
+        # instead of the emulated default so the guest gets its full feature
+        # set
         if os.path.exists("/dev/kvm"):
             self.qemu_args.insert(1, '-enable-kvm')
+            self.qemu_args.extend(["-cpu", "host"])
+        # back guest RAM with hugepages when the host has them mounted, which
+        # cuts TLB misses for the packet-pushing VMs
+        if os.path.ismount("/dev/hugepages"):
+            self.qemu_args.extend(["-mem-path", "/dev/hugepages", "-mem-prealloc"])
 
 
 
     def start(self):
-        self.logger.info("Starting %s" % self)
+        self.logger.info("Starting %s", self)
 
         cmd = list(self.qemu_args)
 
@@ -115,10 +382,17 @@ class VM:
         for i in range(1, math.ceil(self.num_nics / self.nics_per_pci_bus) + 1):
             cmd.extend(["-device", "pci-bridge,chassis_nr={},id=pci.{}".format(i, i)])
 
-        # generate mgmt NICs
-        cmd.extend(self.gen_mgmt())
-        # generate normal NICs
-        cmd.extend(self.gen_nics())
+        # generate mgmt and normal NICs on first start, reuse on restart so
+        # peer VMs don't see new MAC addresses and re-ARP. The NIC args stay
+        # on the command line rather than in a -readconfig file: even 128
+        # NICs amount to ~20 KiB of argv against a 2 MiB ARG_MAX, so a
+        # config file would only add a temp file and a second format to keep
+        # in sync
+        if self._mgmt_args is None:
+            self._mgmt_args = self.gen_mgmt()
+            self._nic_args = self.gen_nics()
+        cmd.extend(self._mgmt_args)
+        cmd.extend(self._nic_args)
 
         self.logger.debug(cmd)
 
@@ -131,45 +405,46 @@ class VM:
 
         self.p = subprocess.Popen(cmd, stdout=subprocess.PIPE,
                         stderr=subprocess.PIPE, universal_newlines=True)
-
-        try:
-            outs, errs = self.p.communicate(timeout=2)
-            self.logger.info("STDOUT: %s" % outs)
-            self.logger.info("STDERR: %s" % errs)
-        except:
-            pass
-
+        # pidfd lets us wait for qemu exit through a selector instead of
+        # polling the process with timeouts
+        self.pidfd = os.pidfd_open(self.p.pid)
+        self._starts += 1
+
+        # the telnet servers are set up with ,server,nowait so they are
+        # available more or less as soon as qemu has exec'd; retry with a
+        # short interval instead of sleeping up front
         for i in range(1, MAX_RETRIES+1):
             try:
-                self.qm = telnetlib.Telnet("127.0.0.1", 4000 + self.num)
+                self.qm = SerialConsole("127.0.0.1", 4000 + self.num)
                 break
-            except:
-                self.logger.info("Unable to connect to qemu monitor (port {}), retrying in a second (attempt {})".format(4000 + self.num, i))
-                time.sleep(1)
+            except (ConnectionRefusedError, OSError):
+                self.logger.info("Unable to connect to qemu monitor (port %d), retrying (attempt %d)", 4000 + self.num, i)
+                time.sleep(0.2)
             if i == MAX_RETRIES:
                 raise QemuBroken("Unable to connect to qemu monitor on port {}".format(4000 + self.num))
 
         for i in range(1, MAX_RETRIES+1):
             try:
-                self.tn = telnetlib.Telnet("127.0.0.1", 5000 + self.num)
+                self.tn = SerialConsole("127.0.0.1", 5000 + self.num)
                 break
-            except:
-                self.logger.info("Unable to connect to qemu monitor (port {}), retrying in a second (attempt {})".format(5000 + self.num, i))
-                time.sleep(1)
+            except (ConnectionRefusedError, OSError):
+                self.logger.info("Unable to connect to serial console (port %d), retrying (attempt %d)", 5000 + self.num, i)
+                time.sleep(0.2)
             if i == MAX_RETRIES:
-                raise QemuBroken("Unable to connect to qemu monitor on port {}".format(5000 + self.num))
-        try:
-            outs, errs = self.p.communicate(timeout=2)
-            self.logger.info("STDOUT: %s" % outs)
-            self.logger.info("STDERR: %s" % errs)
-        except:
-            pass
+                raise QemuBroken("Unable to connect to serial console on port {}".format(5000 + self.num))
+
+        # if a selector is supervising us, register the new process with it.
+        # This keeps supervision alive when bootstrap code restarts us with
+        # stop()/start() without knowing about the selector.
+        if self._selector is not None:
+            self.register_events(self._selector)
 
     def gen_host_forwards(self, mgmt_ip='10.0.0.15', offset=2000):
         """Generate the host forward argument for qemu
         HOST_FWDS contain the ports we want to forward and allows mapping a
         container (source) port to a different destination port on the VR/VM.
-        We do a straight mapping here and let socat do the port mapping. Since
+        We do a straight mapping here and let PortForwarder do the port
+        mapping. Since
         multiple source ports can be mapped to the same destination port, we
         first unique the set of ports.
         """
@@ -181,48 +456,39 @@ class VM:
     def gen_mgmt(self):
         """ Generate qemu args for the mgmt interface(s)
         """
-        res = []
         # mgmt interface is special - we use qemu user mode network
-        res.append("-device")
         # vEOS-lab requires its Ma1 interface to be the first in the bus, so let's hardcode it
         if 'vEOS-lab' in self.image:
-            res.append(self.nic_type + ",netdev=p%(i)02d,mac=%(mac)s,bus=pci.1,addr=0x2"
-                       % { 'i': 0, 'mac': gen_mac(0) })
+            device = f"{self.nic_type},netdev=p00,mac={gen_mac(0)},bus=pci.1,addr=0x2"
         else:
-            res.append(self.nic_type + ",netdev=p%(i)02d,mac=%(mac)s"
-                       % { 'i': 0, 'mac': gen_mac(0) })
-        res.append("-netdev")
-        res.append("user,id=p%(i)02d,net=10.0.0.0/24,tftp=/tftpboot,%(hostfwd)s" % { 'i': 0, 'hostfwd': self.gen_host_forwards() })
-
-        return res
+            device = f"{self.nic_type},netdev=p00,mac={gen_mac(0)}"
+        return ["-device", device,
+                "-netdev", f"user,id=p00,net=10.0.0.0/24,tftp=/tftpboot,{self.gen_host_forwards()}"]
 
 
     def gen_nics(self):
         """ Generate qemu args for the normal traffic carrying interface(s)
         """
-        res = []
         # vEOS-lab requires its Ma1 interface to be the first in the bus, so start normal nics at 2
         if 'vEOS-lab' in self.image:
             range_start = 2
         else:
             range_start = 1
-        for i in range(range_start, self.num_nics+1):
-            # calc which PCI bus we are on and the local add on that PCI bus
-            pci_bus = math.floor(i/self.nics_per_pci_bus) + 1
-            addr = (i % self.nics_per_pci_bus) + 1
-
-            res.append("-device")
-            res.append("%(nic_type)s,netdev=p%(i)02d,mac=%(mac)s,bus=pci.%(pci_bus)s,addr=0x%(addr)x" % {
-                       'nic_type': self.nic_type,
-                       'i': i,
-                       'pci_bus': pci_bus,
-                       'addr': addr,
-                       'mac': gen_mac(i)
-                    })
-            res.append("-netdev")
-            res.append("socket,id=p%(i)02d,listen=:%(j)02d"
-                       % { 'i': i, 'j': i + 10000 })
-        return res
+        nics = range(range_start, self.num_nics+1)
+        # one urandom call supplies the random octets for all MACs instead of
+        # a kernel round-trip per NIC
+        rnd = os.urandom(2 * len(nics))
+        # each NIC contributes a -device/-netdev pair; the device is placed on
+        # a PCI bus calculated from its index
+        return list(chain.from_iterable(
+            ("-device",
+             f"{self.nic_type},netdev=p{i:02d}"
+             f",mac=52:54:00:{rnd[2*k]:02x}:{rnd[2*k+1]:02x}:{i:02x}"
+             f",bus=pci.{i // self.nics_per_pci_bus + 1}"
+             f",addr=0x{i % self.nics_per_pci_bus + 1:x}",
+             "-netdev",
+             f"socket,id=p{i:02d},listen=:{i + 10000}")
+            for k, i in enumerate(nics)))
 
     @property
     def overlay_disk_image(self) -> str:
@@ -258,30 +524,98 @@ class VM:
         pre_start_cmds = ["qemu-img", "create", "-f", "qcow2", "-F", format, "-b", self.image, self.overlay_disk_image]
         return [pre_start_cmds], ["-drive", "if=ide,file=%s" % self.overlay_disk_image]
 
+    def register_events(self, selector):
+        """ Register the qemu pidfd and output pipes with a selector
+
+            The pidfd becomes readable when qemu exits and the pipes when qemu
+            writes output, so a single select() covers process supervision for
+            all VMs without polling each one. The selector is remembered so
+            stop() and start() keep the registrations in sync across restarts.
+            Each registration carries the current start counter so stale
+            events can be told apart from events for the running process.
+        """
+        self._selector = selector
+        os.set_blocking(self.p.stdout.fileno(), False)
+        os.set_blocking(self.p.stderr.fileno(), False)
+        selector.register(self.pidfd, selectors.EVENT_READ, ("exit", self, self._starts))
+        selector.register(self.p.stdout, selectors.EVENT_READ, ("output", self, self._starts))
+        selector.register(self.p.stderr, selectors.EVENT_READ, ("output", self, self._starts))
+
+    def unregister_events(self):
+        """ Remove our qemu fds from the supervising selector, if any
+        """
+        if self._selector is None:
+            return
+        for fileobj in (self.pidfd, self.p.stdout, self.p.stderr):
+            try:
+                self._selector.unregister(fileobj)
+            except KeyError:
+                pass
+
+    def handle_event(self, event, starts):
+        """ React to a qemu event delivered by the selector
+        """
+        if starts != self._starts:
+            # qemu typically writes an error and exits, which delivers the
+            # pipe and pidfd events in the same select() batch; once the
+            # output handler has restarted qemu the exit event is about the
+            # already-reaped process and acting on it would kill the new one
+            return
+        if event == "exit":
+            self.logger.debug("qemu exited, restarting")
+            self.restart()
+            return
+
+        outs = self._drain_pipe(self.p.stdout)
+        errs = self._drain_pipe(self.p.stderr)
+        if outs:
+            self.logger.info("STDOUT: %s", outs)
+        if errs:
+            self.logger.info("STDERR: %s", errs)
+            self.logger.debug("KVM error, restarting")
+            self.stop()
+            self.start()
+
+    def _drain_pipe(self, pipe):
+        """ Read whatever is currently available from a qemu output pipe
+        """
+        try:
+            data = os.read(pipe.fileno(), 65536)
+        except (BlockingIOError, OSError):
+            return ''
+        return data.decode(errors='replace')
+
     def stop(self):
         """ Stop this VM
         """
         self.running = False
 
+        if self.pidfd is None:
+            # already stopped (or never started); keep stop() a no-op so
+            # callers can re-stop a dead VM like they always could
+            return
+
+        # drop our fds from the supervising selector before they are closed
+        # so a later start() can re-register cleanly
+        self.unregister_events()
+
         try:
             self.p.terminate()
         except ProcessLookupError:
-            return
+            pass
 
-        try:
-            self.p.communicate(timeout=10)
-        except:
-            try:
-                # this construct is included as an example at
-                # https://docs.python.org/3.6/library/subprocess.html but has
-                # failed on me so wrapping in another try block. It was this
-                # communicate() that failed with:
-                # ValueError: Invalid file object: <_io.TextIOWrapper name=3 encoding='ANSI_X3.4-1968'>
-                self.p.kill()
-                self.p.communicate(timeout=10)
-            except:
-                # just assume it's dead or will die?
-                self.p.wait(timeout=10)
+        # the pidfd becomes readable once qemu has exited, so this is a
+        # single kernel wait rather than the select/read loop communicate()
+        # would run on a child whose pipes we don't care to drain
+        ready, _, _ = select.select([self.pidfd], [], [], 10)
+        if not ready:
+            self.logger.debug("qemu did not react to SIGTERM, killing it")
+            self.p.kill()
+            select.select([self.pidfd], [], [], 10)
+        self.p.wait(timeout=10)
+
+        os.close(self.pidfd)
+        self.pidfd = None
 
     def restart(self):
         """ Restart this VM
@@ -299,7 +633,7 @@ class VM:
         """ Wait for something on the serial port and then send command
 
             Defaults to using self.tn as connection but this can be overridden
-            by passing a telnetlib.Telnet object in the con argument.
+            by passing a SerialConsole object in the con argument.
         """
         con_name = 'custom con'
         if con is None:
@@ -311,13 +645,32 @@ class VM:
             con_name = 'qemu monitor'
 
         if wait:
-            self.logger.trace("waiting for '%s' on %s" % (wait, con_name))
+            self.logger.trace("waiting for '%s' on %s", wait, con_name)
             res = con.read_until(wait.encode())
-            self.logger.trace("read from %s: %s" % (con_name, res.decode()))
-        self.logger.debug("writing to %s: %s" % (con_name, cmd))
+            # the decode allocates even when trace logging is off, so guard it
+            if self.logger.isEnabledFor(TRACE_LEVEL_NUM):
+                self.logger.trace("read from %s: %s", con_name, res.decode())
+        self.logger.debug("writing to %s: %s", con_name, cmd)
         con.write("{}\r".format(cmd).encode())
 
 
+    def wait_write_many(self, cmds, wait='#'):
+        """ Send a batch of commands in one write and consume the prompts
+
+            All commands are pipelined onto the serial console in a single
+            write so we pay one round-trip for the whole batch instead of
+            one per command. Only usable when every command in the batch
+            returns the same prompt.
+        """
+        self.logger.debug("writing %d commands to serial console", len(cmds))
+        self.tn.write(("\r".join(cmds) + "\r").encode())
+        if wait:
+            for cmd in cmds:
+                res = self.tn.read_until(wait.encode())
+                if self.logger.isEnabledFor(TRACE_LEVEL_NUM):
+                    self.logger.trace("read from serial console: %s", res.decode())
+
+
     def work(self):
         self.check_qemu()
         if not self.running:
@@ -338,15 +691,16 @@ class VM:
             self.logger.debug("VM not started; starting!")
             self.start()
 
-        # check for output
-        try:
-            outs, errs = self.p.communicate(timeout=1)
-        except subprocess.TimeoutExpired:
-            return
-        self.logger.info("STDOUT: %s" % outs)
-        self.logger.info("STDERR: %s" % errs)
-
-        if errs != "":
+        # check for output without blocking on the long-running child;
+        # communicate() is destructive on a process we want to keep around
+        os.set_blocking(self.p.stdout.fileno(), False)
+        os.set_blocking(self.p.stderr.fileno(), False)
+        outs = self._drain_pipe(self.p.stdout)
+        errs = self._drain_pipe(self.p.stderr)
+        if outs:
+            self.logger.info("STDOUT: %s", outs)
+        if errs:
+            self.logger.info("STDERR: %s", errs)
             self.logger.debug("KVM error, restarting")
             self.stop()
             self.start()
@@ -355,7 +709,7 @@ class VM:
         """ Some configuration takes some time to "show up".
             To make sure the device is really ready, wait here.
         """
-        self.logger.debug('waiting for {} to appear in {}'.format(expect, show_cmd))
+        self.logger.debug('waiting for %s to appear in %s', expect, show_cmd)
         wait_spins = 0
         # 10s * 90 = 900s = 15min timeout
         while wait_spins < spins:
@@ -369,12 +723,13 @@ class VM:
                 pass
             self.wait_write(show_cmd, wait=None)
             _, match, data = self.tn.expect([expect.encode('UTF-8')], timeout=10)
-            self.logger.trace(data.decode('UTF-8'))
+            if self.logger.isEnabledFor(TRACE_LEVEL_NUM):
+                self.logger.trace(data.decode('UTF-8'))
             if match:
-                self.logger.debug('a wild {} has appeared!'.format(expect))
+                self.logger.debug('a wild %s has appeared!', expect)
                 return True
             wait_spins += 1
-        self.logger.error('{} not found in {}'.format(expect, show_cmd))
+        self.logger.error('%s not found in %s', expect, show_cmd)
         return False
 
     @property
@@ -394,37 +749,93 @@ class VR:
     def __init__(self, username, password):
         self.logger = logging.getLogger()
         self.vms = []
+        self.forwarders = []
+        self._health_fd = None
+        self._last_health = None
 
-        try:
-            os.mkdir("/tftpboot")
-        except:
-            pass
+        os.makedirs("/tftpboot", exist_ok=True)
 
     def update_health(self, exit_status, message):
-        health_file = open("/health", "w")
-        health_file.write("%d %s" % (exit_status, message))
-        health_file.close()
+        # only touch /health when the status actually changes; the main loop
+        # calls this on every iteration
+        health = (exit_status, message)
+        if health == self._last_health:
+            return
+        self._last_health = health
+
+        if self._health_fd is None:
+            self._health_fd = os.open("/health", os.O_WRONLY | os.O_CREAT, 0o644)
+        os.lseek(self._health_fd, 0, os.SEEK_SET)
+        os.ftruncate(self._health_fd, 0)
+        os.write(self._health_fd, ("%d %s" % (exit_status, message)).encode())
 
-    def start_socat(self, src_offset=0, dst_offset=2000):
-        for proto, src_port, dst_port in HOST_FWDS:
-            run_command(["socat", "%s-LISTEN:%d,fork" % (proto.upper(), src_port + src_offset),
-                         "%s:127.0.0.1:%d" % (proto.upper(), dst_port + dst_offset)],
-                         background=True)
+    def start_port_forwards(self, src_offset=0, dst_offset=2000):
+        """ Forward the HOST_FWDS ports to the VM's hostfwd ports
+
+            Runs in-process on a single event loop instead of forking one
+            socat per forwarded port.
+        """
+        self.forwarders.append(PortForwarder(HOST_FWDS, src_offset, dst_offset))
 
     def start(self):
         """ Start the virtual router
         """
         self.logger.debug("Starting vrnetlab %s", self)
         self.logger.debug("VMs: %s", self.vms)
-        self.start_socat()
+        self.start_port_forwards()
+
+        # start all VMs in parallel; qemu spawn time is dominated by KVM
+        # device-model setup and there are no dependencies between the VMs
+        # (the int_cp bridge is already set up in our constructor)
+        to_start = [vm for vm in self.vms if vm.p is None]
+        if to_start:
+            with ThreadPoolExecutor(max_workers=len(to_start)) as executor:
+                # consume the iterator so any exception from a start surfaces
+                list(executor.map(lambda vm: vm.start(), to_start))
+
+        selector = selectors.DefaultSelector()
+        for vm in self.vms:
+            vm.register_events(selector)
 
         started = False
         while True:
+            # block until qemu exits or produces output. While VMs are still
+            # bootstrapping the console select below provides the pacing;
+            # once everything is running we only wake on real events.
+            all_running = all(vm.running for vm in self.vms)
+            timeout = None if all_running else 0
+            for key, _ in selector.select(timeout=timeout):
+                event, vm, starts = key.data
+                vm.handle_event(event, starts)
+
+            # wait for console output from all bootstrapping VMs in a single
+            # select so that one quiet VM doesn't hold up the others. If
+            # nothing happens within a second we spin them all so their
+            # no-output timeouts still tick.
+            booting = [vm for vm in self.vms if not vm.running]
+            if booting:
+                # the console buffers in userspace, so a VM whose next prompt
+                # already sits in tn.buf is ready even though its socket is
+                # quiet -- don't block on select while such data is pending
+                timeout = 0 if any(vm.tn.buf for vm in booting) else 1
+                ready, _, _ = select.select([vm.tn for vm in booting], [], [],
+                                            timeout)
+                spin_vms = [vm for vm in booting
+                            if vm.tn in ready or vm.tn.buf] or booting
+            else:
+                spin_vms = []
+
             all_running = True
             for vm in self.vms:
-                vm.work()
                 if not vm.running:
                     all_running = False
+                    if vm not in spin_vms:
+                        continue
+                    try:
+                        vm.bootstrap_spin()
+                    except EOFError:
+                        self.logger.error("Telnet session was disconnected, restarting")
+                        vm.restart()
 
             if all_running:
                 self.update_health(0, "running")
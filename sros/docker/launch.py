@@ -1,12 +1,14 @@
 #!/usr/bin/env python3
 
 import datetime
+import errno
 import logging
 import math
 import os
 import re
 import signal
 import sys
+from itertools import chain
 
 import vrnetlab
 
@@ -29,6 +31,29 @@ def trace(self, message, *args, **kws):
 logging.Logger.trace = trace
 
 
+def move_file(src, dst):
+    """ Move a file into place
+
+        os.rename only works within one filesystem; /tftpboot may be a
+        separate mount (e.g. tmpfs), so fall back to a kernel-side sendfile
+        copy when the rename fails with EXDEV.
+    """
+    try:
+        os.rename(src, dst)
+    except OSError as exc:
+        if exc.errno != errno.EXDEV:
+            raise
+        with open(src, 'rb') as s, open(dst, 'wb') as d:
+            count = os.fstat(s.fileno()).st_size
+            offset = 0
+            while offset < count:
+                sent = os.sendfile(d.fileno(), s.fileno(), offset, count - offset)
+                if sent == 0:
+                    break
+                offset += sent
+        os.unlink(src)
+
+
 def mangle_uuid(uuid):
     """ Mangle the UUID to fix endianness mismatch on first part
     """
@@ -48,19 +73,30 @@ def mangle_uuid(uuid):
 def uuid_rev_part(part):
     """ Reverse part of a UUID
     """
-    res = ""
-    for i in reversed(range(0, len(part), 2)):
-        res += part[i]
-        res += part[i+1]
-    return res
+    return bytes(reversed(bytes.fromhex(part))).hex()
 
 
 # Add gNMI ports
 vrnetlab.HOST_FWDS.append(('tcp', 9339, 57400))
 vrnetlab.HOST_FWDS.append(('tcp', 57400, 57400))
 
+# start date embedded in the license file
+LICENSE_DATE_RE = re.compile(r"([0-9]{4}-[0-9]{2}-)([0-9]{2})")
+# major release number embedded in the qcow2 file name
+QCOW2_RELEASE_RE = re.compile(r'[^0-9]+([0-9]+)\S+\.qcow2$')
+
+# SMBIOS strings handed to TIMOS, built once instead of per VM instance
+SMBIOS_INTEGRATED = "type=1,product=TIMOS:address=10.0.0.15/24@active license-file=tftp://10.0.0.2/license.txt slot=A chassis=SR-c12 card=cfm-xp-b mda/1=m20-1gb-xp-sfp"
+SMBIOS_CP_XCM = "type=1,product=TIMOS:address=10.0.0.15/24@active license-file=tftp://10.0.0.2/license.txt chassis=XRS-20 chassis-topology=XRS-40 slot=A sfm=sfm-x20-b card=xcm-x20"
+SMBIOS_CP_CPM = "type=1,product=TIMOS:address=10.0.0.15/24@active license-file=tftp://10.0.0.2/license.txt chassis=XRS-20 chassis-topology=XRS-40 slot=A sfm=sfm-x20-b card=cpm-x20"
+SMBIOS_LC = "type=1,product=TIMOS:chassis=XRS-20 chassis-topology=XRS-40 slot={slot} sfm=sfm-x20-b card=xcm-x20 mda/1=cx20-10g-sfp"
+
 
 class SROS_vm(vrnetlab.VM):
+    # patterns matched against the console during bootstrap, compiled once
+    # instead of per expect() call
+    EXPECT_PATTERNS = [re.compile(b"Login:"), re.compile(b"^[^ ]+#")]
+
     def __init__(self, username, password, num=0):
         super(SROS_vm, self).__init__(username, password, disk_image = "/sros.qcow2", num=num, ram=6144)
 
@@ -81,7 +117,7 @@ class SROS_vm(vrnetlab.VM):
             self.spins = 0
             return
 
-        (ridx, match, res) = self.tn.expect([b"Login:", b"^[^ ]+#"], 1)
+        (ridx, match, res) = self.tn.expect(self.EXPECT_PATTERNS, 1)
         if match: # got a match!
             if ridx == 0: # matched login prompt, so should login
                 self.logger.debug("matched login prompt")
@@ -93,14 +129,15 @@ class SROS_vm(vrnetlab.VM):
             self.tn.close()
             # calc startup time
             startup_time = datetime.datetime.now() - self.start_time
-            self.logger.info("Startup complete in: %s" % startup_time)
+            self.logger.info("Startup complete in: %s", startup_time)
             self.running = True
             return
 
         # no match, if we saw some output from the router it's probably
         # booting, so let's give it some more time
         if res != b'':
-            self.logger.trace("OUTPUT: %s" % res.decode())
+            if self.logger.isEnabledFor(TRACE_LEVEL_NUM):
+                self.logger.trace("OUTPUT: %s", res.decode())
             # reset spins if we saw some output
             self.spins = 0
 
@@ -117,24 +154,19 @@ class SROS_vm(vrnetlab.VM):
             self.logger.info("No license file found")
             return
 
-        lic_file = open("/tftpboot/license.txt", "r")
-        license = ""
-        for line in lic_file.readlines():
+        with open("/tftpboot/license.txt", "r") as lic_file:
             # ignore comments in license file
-            if line.startswith('#'):
-                continue
-            license += line
-        lic_file.close()
+            license = "".join(line for line in lic_file
+                              if not line.startswith('#'))
         try:
             uuid_input = license.split(" ")[0]
-            self.uuid = mangle_uuid(uuid_input)
             self.uuid = uuid_input
-            m = re.search("([0-9]{4}-[0-9]{2}-)([0-9]{2})", license)
+            m = LICENSE_DATE_RE.search(license)
             if m:
                 self.fake_start_date = "%s%02d" % (m.group(1), int(m.group(2))+1)
-        except:
-            raise ValueError("Unable to parse license file")
-        self.logger.info("License file found for UUID %s with start date %s" % (self.uuid, self.fake_start_date))
+        except (IndexError, AttributeError, ValueError) as e:
+            raise ValueError("Unable to parse license file") from e
+        self.logger.info("License file found for UUID %s with start date %s", self.uuid, self.fake_start_date)
 
 
 class SROS_integrated(SROS_vm):
@@ -144,7 +176,7 @@ class SROS_integrated(SROS_vm):
         super(SROS_integrated, self).__init__(username, password)
         self.mode = mode
         self.num_nics = 5
-        self.smbios = ["type=1,product=TIMOS:address=10.0.0.15/24@active license-file=tftp://10.0.0.2/license.txt slot=A chassis=SR-c12 card=cfm-xp-b mda/1=m20-1gb-xp-sfp"]
+        self.smbios = [SMBIOS_INTEGRATED]
 
 
 
@@ -167,29 +199,32 @@ class SROS_integrated(SROS_vm):
     def bootstrap_config(self):
         """ Do the actual bootstrap config
         """
+        cmds = []
         if self.username and self.password:
-            self.wait_write("configure system security user \"%s\" password %s" % (self.username, self.password))
-            self.wait_write("configure system security user \"%s\" access console netconf grpc" % (self.username))
-            self.wait_write("configure system security user \"%s\" console member \"administrative\" \"default\"" % (self.username))
-        self.wait_write("configure system netconf no shutdown")
-        self.wait_write("configure system grpc allow-unsecure-connection")
-        self.wait_write("configure system grpc no shutdown")
-        self.wait_write("configure system security profile \"administrative\" netconf base-op-authorization lock")
-        self.wait_write("configure system login-control ssh inbound-max-sessions 30")
-        self.wait_write("configure card 1 mda 1 shutdown")
-        self.wait_write("configure card 1 mda 1 no mda-type")
-        self.wait_write("configure card 1 shutdown")
-        self.wait_write("configure card 1 no card-type")
-        self.wait_write("configure card 1 card-type iom-xp-b")
-        self.wait_write("configure card 1 mcm 1 mcm-type mcm-xp")
-        self.wait_write("configure card 1 mda 1 mda-type m20-1gb-xp-sfp")
-        self.wait_write("configure card 1 no shutdown")
+            cmds.append("configure system security user \"%s\" password %s" % (self.username, self.password))
+            cmds.append("configure system security user \"%s\" access console netconf grpc" % (self.username))
+            cmds.append("configure system security user \"%s\" console member \"administrative\" \"default\"" % (self.username))
+        cmds.append("configure system netconf no shutdown")
+        cmds.append("configure system grpc allow-unsecure-connection")
+        cmds.append("configure system grpc no shutdown")
+        cmds.append("configure system security profile \"administrative\" netconf base-op-authorization lock")
+        cmds.append("configure system login-control ssh inbound-max-sessions 30")
+        cmds.append("configure card 1 mda 1 shutdown")
+        cmds.append("configure card 1 mda 1 no mda-type")
+        cmds.append("configure card 1 shutdown")
+        cmds.append("configure card 1 no card-type")
+        cmds.append("configure card 1 card-type iom-xp-b")
+        cmds.append("configure card 1 mcm 1 mcm-type mcm-xp")
+        cmds.append("configure card 1 mda 1 mda-type m20-1gb-xp-sfp")
+        cmds.append("configure card 1 no shutdown")
         if self.mode != 'cli':
-            self.wait_write("configure system management-interface yang-modules no nokia-modules")
-            self.wait_write("configure system management-interface yang-modules nokia-combined-modules")
-            self.wait_write("configure system management-interface yang-modules no base-r13-modules")
-            self.wait_write("configure system management-interface configuration-mode {}".format(self.mode))
-        self.wait_write("admin save")
+            cmds.append("configure system management-interface yang-modules no nokia-modules")
+            cmds.append("configure system management-interface yang-modules nokia-combined-modules")
+            cmds.append("configure system management-interface yang-modules no base-r13-modules")
+            cmds.append("configure system management-interface configuration-mode {}".format(self.mode))
+        cmds.append("admin save")
+        # all commands return the same prompt, so pipeline them in one batch
+        self.wait_write_many(cmds)
         self.wait_write("logout")
 
 class SROS_cp(SROS_vm):
@@ -202,18 +237,18 @@ class SROS_cp(SROS_vm):
         self.num_nics = 0
         if major_release >= 19:
             self.logger.info("SROS release 19 or higher, use card xcm-x20 instead of cpm-x20")
-            self.smbios = ["type=1,product=TIMOS:address=10.0.0.15/24@active license-file=tftp://10.0.0.2/license.txt chassis=XRS-20 chassis-topology=XRS-40 slot=A sfm=sfm-x20-b card=xcm-x20"]
+            self.smbios = [SMBIOS_CP_XCM]
         else:
-            self.smbios = ["type=1,product=TIMOS:address=10.0.0.15/24@active license-file=tftp://10.0.0.2/license.txt chassis=XRS-20 chassis-topology=XRS-40 slot=A sfm=sfm-x20-b card=cpm-x20"]
+            self.smbios = [SMBIOS_CP_CPM]
 
 
     def start(self):
         # use parent class start() function
         super(SROS_cp, self).start()
-        # add interface to internal control plane bridge
-        vrnetlab.run_command(["brctl", "addif", "int_cp", "vcp-int"])
-        vrnetlab.run_command(["ip", "link", "set", "vcp-int", "up"])
-        vrnetlab.run_command(["ip", "link", "set", "dev", "vcp-int", "mtu", "10000"])
+        # add interface to internal control plane bridge; enslave, raise and
+        # set MTU in a single iproute2 invocation instead of three spawns
+        vrnetlab.run_command(["ip", "link", "set", "dev", "vcp-int",
+                              "master", "int_cp", "mtu", "10000", "up"])
 
 
 
@@ -236,31 +271,33 @@ class SROS_cp(SROS_vm):
     def bootstrap_config(self):
         """ Do the actual bootstrap config
         """
+        cmds = []
         if self.username and self.password:
-            self.wait_write("configure system security user \"%s\" password %s" % (self.username, self.password))
-            self.wait_write("configure system security user \"%s\" access console netconf grpc" % (self.username))
-            self.wait_write("configure system security user \"%s\" console member \"administrative\" \"default\"" % (self.username))
-        self.wait_write("configure system netconf no shutdown")
-        self.wait_write("configure system grpc allow-unsecure-connection")
-        self.wait_write("configure system grpc no shutdown")
-        self.wait_write("configure system security profile \"administrative\" netconf base-op-authorization lock")
-        self.wait_write("configure system login-control ssh inbound-max-sessions 30")
+            cmds.append("configure system security user \"%s\" password %s" % (self.username, self.password))
+            cmds.append("configure system security user \"%s\" access console netconf grpc" % (self.username))
+            cmds.append("configure system security user \"%s\" console member \"administrative\" \"default\"" % (self.username))
+        cmds.append("configure system netconf no shutdown")
+        cmds.append("configure system grpc allow-unsecure-connection")
+        cmds.append("configure system grpc no shutdown")
+        cmds.append("configure system security profile \"administrative\" netconf base-op-authorization lock")
+        cmds.append("configure system login-control ssh inbound-max-sessions 30")
 
         # configure SFMs
-        for i in range(1, 17):
-            self.wait_write("configure sfm {} sfm-type sfm-x20-b".format(i))
+        cmds.extend("configure sfm {} sfm-type sfm-x20-b".format(i) for i in range(1, 17))
 
         # configure line card & MDAs
         for i in range(1, self.num_lc+1):
-            self.wait_write("configure card {} card-type xcm-x20".format(i))
-            self.wait_write("configure card {} mda 1 mda-type cx20-10g-sfp".format(i))
+            cmds.append("configure card {} card-type xcm-x20".format(i))
+            cmds.append("configure card {} mda 1 mda-type cx20-10g-sfp".format(i))
 
         if self.mode != 'cli':
-            self.wait_write("configure system management-interface yang-modules no nokia-modules")
-            self.wait_write("configure system management-interface yang-modules nokia-combined-modules")
-            self.wait_write("configure system management-interface yang-modules no base-r13-modules")
-            self.wait_write("configure system management-interface configuration-mode {}".format(self.mode))
-        self.wait_write("admin save")
+            cmds.append("configure system management-interface yang-modules no nokia-modules")
+            cmds.append("configure system management-interface yang-modules nokia-combined-modules")
+            cmds.append("configure system management-interface yang-modules no base-r13-modules")
+            cmds.append("configure system management-interface configuration-mode {}".format(self.mode))
+        cmds.append("admin save")
+        # all commands return the same prompt, so pipeline them in one batch
+        self.wait_write_many(cmds)
         self.wait_write("logout")
 
 
@@ -274,17 +311,17 @@ class SROS_lc(SROS_vm):
         self.slot = slot
 
         self.num_nics = 6
-        self.smbios = ["type=1,product=TIMOS:chassis=XRS-20 chassis-topology=XRS-40 slot={} sfm=sfm-x20-b card=xcm-x20 mda/1=cx20-10g-sfp".format(slot)]
+        self.smbios = [SMBIOS_LC.format(slot=slot)]
 
 
 
     def start(self):
         # use parent class start() function
         super(SROS_lc, self).start()
-        # add interface to internal control plane bridge
-        vrnetlab.run_command(["brctl", "addif", "int_cp", "vfpc{}-int".format(self.slot)])
-        vrnetlab.run_command(["ip", "link", "set", "vfpc{}-int".format(self.slot), "up"])
-        vrnetlab.run_command(["ip", "link", "set", "dev", "vfpc{}-int".format(self.slot), "mtu", "10000"])
+        # add interface to internal control plane bridge; enslave, raise and
+        # set MTU in a single iproute2 invocation instead of three spawns
+        vrnetlab.run_command(["ip", "link", "set", "dev", "vfpc{}-int".format(self.slot),
+                              "master", "int_cp", "mtu", "10000", "up"])
 
 
 
@@ -306,18 +343,14 @@ class SROS_lc(SROS_vm):
     def gen_nics(self):
         """ Generate qemu args for the normal traffic carrying interface(s)
         """
-        res = []
         # TODO: should this offset business be put in the common vrnetlab?
         offset = 6 * (self.slot-1)
-        for j in range(0, self.num_nics):
-            i = offset + j + 1
-            res.append("-device")
-            res.append(self.nic_type + ",netdev=p%(i)02d,mac=%(mac)s"
-                       % { 'i': i, 'mac': vrnetlab.gen_mac(i) })
-            res.append("-netdev")
-            res.append("socket,id=p%(i)02d,listen=:100%(i)02d"
-                       % { 'i': i })
-        return res
+        return list(chain.from_iterable(
+            ("-device",
+             f"{self.nic_type},netdev=p{i:02d},mac={vrnetlab.gen_mac(i)}",
+             "-netdev",
+             f"socket,id=p{i:02d},listen=:100{i:02d}")
+            for i in range(offset + 1, offset + self.num_nics + 1)))
 
 
 
@@ -338,13 +371,13 @@ class SROS(vrnetlab.VR):
 
         # move files into place
         for e in sorted(os.listdir("/")):
-            match = re.match(r'[^0-9]+([0-9]+)\S+\.qcow2$', e)
-            if match:
-                major_release = int(match.group(1))
-            if re.search("\.qcow2$", e):
-                os.rename("/" + e, "/sros.qcow2")
-            if re.search("\.license$", e):
-                os.rename("/" + e, "/tftpboot/license.txt")
+            if e.endswith(".qcow2"):
+                match = QCOW2_RELEASE_RE.match(e)
+                if match:
+                    major_release = int(match.group(1))
+                move_file("/" + e, "/sros.qcow2")
+            if e.endswith(".license"):
+                move_file("/" + e, "/tftpboot/license.txt")
 
         self.license = False
         if os.path.isfile("/tftpboot/license.txt"):
@@ -369,7 +402,7 @@ class SROS(vrnetlab.VR):
             self.vms = [ SROS_integrated(username, password, mode) ]
 
         # set up bridge for connecting CP with LCs
-        vrnetlab.run_command(["brctl", "addbr", "int_cp"])
+        vrnetlab.run_command(["ip", "link", "add", "int_cp", "type", "bridge"])
         vrnetlab.run_command(["ip", "link", "set", "int_cp", "up"])
 
 
@@ -7,7 +7,6 @@ import random
 import re
 import signal
 import sys
-import telnetlib
 import time
 
 import vrnetlab
@@ -301,9 +301,9 @@ class VMX(vrnetlab.VR):
         vrnetlab.run_command(["ip", "link", "set", "int_cp", "up"])
 
     def start(self):
-        # Set up socats for re1, with a different offset: $CONTAINER_IP:1022 -> 10.0.0.16:3022
+        # Set up forwards for re1, with a different offset: $CONTAINER_IP:1022 -> 10.0.0.16:3022
         if self.dual_re:
-            self.start_socat(src_offset=1000, dst_offset=3000)
+            self.start_port_forwards(src_offset=1000, dst_offset=3000)
 
         super(VMX, self).start()
 
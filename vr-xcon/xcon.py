@@ -10,8 +10,11 @@ import socket
 import struct
 import subprocess
 import sys
+import threading
 import time
 
+from functools import lru_cache
+
 
 def handle_SIGCHLD(signal, frame):
     os.waitpid(-1, os.WNOHANG)
@@ -23,6 +26,44 @@ signal.signal(signal.SIGINT, handle_SIGTERM)
 signal.signal(signal.SIGTERM, handle_SIGTERM)
 signal.signal(signal.SIGCHLD, handle_SIGCHLD)
 
+# the 4-byte network-order length prefix qemu uses on its socket netdevs;
+# precompiled so the hot paths don't pay for parsing the format string and
+# the big-endian unpack replaces the unpack+ntohl two-step
+_HDR = struct.Struct("!I")
+
+# size of the Tcp2Tap receive ring; must hold at least one max-size frame
+# plus its 4-byte header
+_RING_SIZE = 64 * 1024
+
+
+def tune_socket(sock):
+    """ Tune a relay socket: disable Nagle and grow the kernel buffers
+
+        Router control packets are small, so Nagle would sit on them waiting
+        for ACKs; the default ~208 KiB buffers are also easy to fill during
+        convergence bursts.
+    """
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 1 << 20)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 20)
+
+
+@lru_cache(maxsize=1024)
+def resolve_hostintf(hostintf):
+    """ Resolve a hostname/interface pair to the sockaddr qemu listens on
+
+        Memoized so reconnect attempts for a flapping link don't redo the
+        (potentially tens of ms, blocking) DNS lookup every time. Failed
+        lookups raise and are not cached, so they are retried.
+    """
+    hostname, interface = hostintf.split("/")
+    try:
+        res = socket.getaddrinfo(hostname, "100%02d" % int(interface),
+                                 socket.AF_INET, socket.SOCK_STREAM)
+    except socket.gaierror:
+        raise NoVR("Unable to resolve %s" % hostname)
+    return res[0][4]
+
 
 
 class Tcp2Raw:
@@ -56,6 +97,7 @@ class Tcp2Raw:
             if ir == self.s:
                 self.logger.debug("received incoming TCP connection, setting up!")
                 self.tcp, addr = self.s.accept()
+                tune_socket(self.tcp)
             elif ir == self.tcp:
                 self.logger.debug("received packet from TCP and sending to raw interface")
 
@@ -75,19 +117,19 @@ class Tcp2Raw:
                     continue
 
                 self.tcp_buf += buf
-                self.logger.debug("read %d bytes from tcp, tcp_buf length %d" % (len(buf), len(self.tcp_buf)))
+                self.logger.debug("read %d bytes from tcp, tcp_buf length %d", len(buf), len(self.tcp_buf))
                 while True:
                     if self.tcp_state == 0:
                         # we want to read the size, which is 4 bytes, if we
                         # don't have enough bytes wait for the next spin
-                        if not len(self.tcp_buf) > 4:
+                        if len(self.tcp_buf) < 4:
                             self.logger.debug("reading size - less than 4 bytes available in buf; waiting for next spin")
                             break
-                        size = socket.ntohl(struct.unpack("I", self.tcp_buf[:4])[0]) # first 4 bytes is size of packet
+                        size = _HDR.unpack_from(self.tcp_buf)[0] # first 4 bytes is size of packet
                         self.tcp_buf = self.tcp_buf[4:] # remove first 4 bytes of buf
                         self.tcp_remaining = size
                         self.tcp_state = 1
-                        self.logger.debug("reading size - pkt size: %d" % self.tcp_remaining)
+                        self.logger.debug("reading size - pkt size: %d", self.tcp_remaining)
 
                     if self.tcp_state == 1: # read packet data
                         # we want to read the whole packet, which is specified
@@ -96,7 +138,7 @@ class Tcp2Raw:
                         if len(self.tcp_buf) < self.tcp_remaining:
                             self.logger.debug("reading packet - less than remaining bytes; waiting for next spin")
                             break
-                        self.logger.debug("reading packet - reading %d bytes" % self.tcp_remaining)
+                        self.logger.debug("reading packet - reading %d bytes", self.tcp_remaining)
                         payload = self.tcp_buf[:self.tcp_remaining]
                         self.tcp_buf = self.tcp_buf[self.tcp_remaining:]
                         self.tcp_remaining = 0
@@ -106,13 +148,13 @@ class Tcp2Raw:
             else:
                 # we always get full packets from the raw interface
                 payload = self.raw.recv(2048)
-                buf = struct.pack("I", socket.htonl(len(payload))) + payload
                 if self.tcp is None:
                     self.logger.warning("received packet from raw interface but TCP not connected, discarding packet")
                 else:
                     self.logger.debug("received packet from raw interface and sending to TCP")
                     try:
-                        self.tcp.send(buf)
+                        # kernel gathers header and payload into one segment
+                        self.tcp.sendmsg([_HDR.pack(len(payload)), payload])
                     except:
                         self.logger.warning("could not send packet to TCP session")
 
@@ -126,10 +168,12 @@ class Tcp2Tap:
         self.s.listen(1)
         self.tcp = None
 
-        # track current state of TCP side tunnel. 0 = reading size, 1 = reading packet
-        self.tcp_state = 0
-        self.tcp_buf = b''
-        self.tcp_remaining = 0
+        # incoming TCP bytes land in a fixed ring buffer instead of a bytes
+        # object that is grown and re-sliced per frame (which copies the
+        # residual tail every time). head/tail are monotonically increasing
+        # byte counts; the ring index is pos % _RING_SIZE
+        self._ring = bytearray(_RING_SIZE)
+        self._ring_mv = memoryview(self._ring)
 
         # setup tap side
         TUNSETIFF = 0x400454ca
@@ -144,75 +188,129 @@ class Tcp2Tap:
         # ifname - good for when we do dynamic interface name
         ifname = ifs[:16].decode().strip("\x00")
 
+        # reusable buffer for the tap side; os.readv fills it in place
+        # instead of allocating a fresh bytes object per packet
+        self._tap_buf = bytearray(2048)
+        self._tap_mv = memoryview(self._tap_buf)
 
-    def work(self):
+
+    def tap2tcp(self):
+        """ Relay packets from the tap interface onto the TCP session
+
+            Runs in its own thread with plain blocking IO; CPython releases
+            the GIL around the read and send syscalls so this direction
+            makes progress even while the other thread is busy parsing the
+            TCP stream - the bridge is full duplex.
+        """
+        # bind the loop invariants to locals; LOAD_FAST beats the repeated
+        # attribute lookups in this per-packet loop. self.tcp stays an
+        # attribute read since the other thread rebinds it
+        readv = os.readv
+        tap = self.tap
+        bufs = [self._tap_buf]
+        tap_mv = self._tap_mv
+        pack = _HDR.pack
+        log = self.logger
         while True:
-            skts = [self.s, self.tap]
-            if self.tcp is not None:
-                skts.append(self.tcp)
-            ir = select.select(skts,[],[])[0][0]
-            if ir == self.s:
-                self.logger.debug("received incoming TCP connection, setting up!")
-                self.tcp, addr = self.s.accept()
-            elif ir == self.tcp:
-                self.logger.debug("received packet from TCP and sending to tap interface")
+            # we always get full packets from the tap interface
+            n = readv(tap, bufs)
+            tcp = self.tcp
+            if tcp is None:
+                log.warning("received packet from tap interface but TCP not connected, discarding packet")
+                continue
+            log.debug("received packet from tap interface and sending to TCP")
+            try:
+                # let the kernel gather header and payload into one segment
+                # instead of concatenating them in user space first
+                tcp.sendmsg([pack(n), tap_mv[:n]])
+            except:
+                log.warning("could not send packet to TCP session")
 
+
+    def work(self):
+        threading.Thread(target=self.tap2tcp, daemon=True).start()
+
+        # loop invariants as locals, same reasoning as in tap2tcp; head and
+        # tail live in locals during a session and are written back to the
+        # instance when it ends
+        ring = self._ring
+        ring_mv = self._ring_mv
+        tap = self.tap
+        unpack_from = _HDR.unpack_from
+        unpack = _HDR.unpack
+        writev = os.writev
+        log = self.logger
+
+        # this thread owns the tcp->tap direction: accept a session, then
+        # receive into the ring and unframe until the client goes away
+        while True:
+            tcp, addr = self.s.accept()
+            log.debug("received incoming TCP connection, setting up!")
+            tune_socket(tcp)
+            recv_into = tcp.recv_into
+            head = 0
+            tail = 0
+            self.tcp = tcp
+
+            while self.tcp is not None:
+                # receive into the free region after tail, stopping at the
+                # wrap; the next spin picks up the rest
+                space = _RING_SIZE - (tail - head)
+                if space == 0:
+                    # can't happen as long as the size guard below holds,
+                    # but don't spin forever if it does
+                    break
+                ti = tail % _RING_SIZE
                 try:
-                    buf = ir.recv(2048)
+                    n = recv_into(ring_mv[ti:ti + min(space, _RING_SIZE - ti)])
                 except (ConnectionResetError, OSError):
-                    self.logger.warning("connection dropped")
-                    continue
+                    log.warning("connection dropped")
+                    break
 
-                if len(buf) == 0:
-                    self.logger.info("no data from TCP socket, assuming client hung up, closing our socket")
-                    ir.close()
-                    self.tcp = None
-                    self.tcp_state = 0
-                    self.tcp_buf = b''
-                    self.tcp_remaining = 0
-                    continue
+                if n == 0:
+                    log.info("no data from TCP socket, assuming client hung up, closing our socket")
+                    break
 
-                self.tcp_buf += buf
-                self.logger.debug("read %d bytes from tcp, tcp_buf length %d" % (len(buf), len(self.tcp_buf)))
+                tail += n
+                log.debug("read %d bytes from tcp, %d bytes buffered", n, tail - head)
                 while True:
-                    if self.tcp_state == 0:
-                        # we want to read the size, which is 4 bytes, if we
-                        # don't have enough bytes wait for the next spin
-                        if not len(self.tcp_buf) > 4:
-                            self.logger.debug("reading size - less than 4 bytes available in buf; waiting for next spin")
-                            break
-                        size = socket.ntohl(struct.unpack("I", self.tcp_buf[:4])[0]) # first 4 bytes is size of packet
-                        self.tcp_buf = self.tcp_buf[4:] # remove first 4 bytes of buf
-                        self.tcp_remaining = size
-                        self.tcp_state = 1
-                        self.logger.debug("reading size - pkt size: %d" % self.tcp_remaining)
-
-                    if self.tcp_state == 1: # read packet data
-                        # we want to read the whole packet, which is specified
-                        # by tcp_remaining, if we don't have enough bytes we
-                        # wait for the next spin
-                        if len(self.tcp_buf) < self.tcp_remaining:
-                            self.logger.debug("reading packet - less than remaining bytes; waiting for next spin")
-                            break
-                        self.logger.debug("reading packet - reading %d bytes" % self.tcp_remaining)
-                        payload = self.tcp_buf[:self.tcp_remaining]
-                        self.tcp_buf = self.tcp_buf[self.tcp_remaining:]
-                        self.tcp_remaining = 0
-                        self.tcp_state = 0
-                        os.write(self.tap, payload)
-
-            else:
-                # we always get full packets from the tap interface
-                payload = os.read(self.tap, 2048)
-                buf = struct.pack("I", socket.htonl(len(payload))) + payload
-                if self.tcp is None:
-                    self.logger.warning("received packet from tap interface but TCP not connected, discarding packet")
-                else:
-                    self.logger.debug("received packet from tap interface and sending to TCP")
-                    try:
-                        self.tcp.send(buf)
-                    except:
-                        self.logger.warning("could not send packet to TCP session")
+                    # we want to read the size, which is 4 bytes, if we
+                    # don't have enough bytes wait for the next spin
+                    avail = tail - head
+                    if avail < 4:
+                        break
+                    hi = head % _RING_SIZE
+                    if hi + 4 <= _RING_SIZE:
+                        size = unpack_from(ring, hi)[0] # first 4 bytes is size of packet
+                    else:
+                        # header straddles the wrap; stitch it together
+                        size = unpack(bytes(ring_mv[hi:]) + bytes(ring_mv[:hi + 4 - _RING_SIZE]))[0]
+
+                    if size > _RING_SIZE - 4:
+                        log.warning("frame of %d bytes exceeds ring buffer, dropping connection", size)
+                        self.tcp = None
+                        break
+
+                    # we want the whole packet, if we don't have enough
+                    # bytes we wait for the next spin
+                    if avail < 4 + size:
+                        break
+                    start = (head + 4) % _RING_SIZE
+                    if start + size <= _RING_SIZE:
+                        writev(tap, [ring_mv[start:start + size]])
+                    else:
+                        writev(tap, [ring_mv[start:], ring_mv[:size - (_RING_SIZE - start)]])
+                    head += 4 + size
+                    if head == tail:
+                        # ring drained - rewind to the start so the common
+                        # case (every recv carries whole frames) parses at
+                        # offset 0 and never hits the wrap-stitching
+                        # branches above
+                        head = 0
+                        tail = 0
+
+            self.tcp = None
+            tcp.close()
 
 
 
@@ -220,19 +318,24 @@ class TcpBridge:
     def __init__(self):
         self.logger = logging.getLogger()
         self.sockets = []
-        self.socket2remote = {}
-        self.socket2hostintf = {}
+        # fds are small dense ints, so plain lists indexed by fileno beat
+        # socket-keyed dicts in the hot path: no hashing, better locality
+        self._remote_sock = []
+        self._hostintf = []
+        # in-kernel interest list; select() would rebuild its fd sets and
+        # scan all sockets on every call, which gets expensive with many p2p
+        # links in one process
+        self.epoll = select.epoll()
+        self.fd2sock = {}
+        # pool of reusable receive buffers; recv_into avoids allocating a
+        # fresh bytes object per packet and the pool lets a whole burst be
+        # drained before anything is sent. Grown on demand if a burst
+        # outruns it
+        self._bufs = [bytearray(2048) for _ in range(8)]
 
 
     def hostintf2addr(self, hostintf):
-        hostname, interface = hostintf.split("/")
-
-        try:
-            res = socket.getaddrinfo(hostname, "100%02d" % int(interface), socket.AF_INET)
-        except socket.gaierror:
-            raise NoVR("Unable to resolve %s" % hostname)
-        sockaddr = res[0][4]
-        return sockaddr
+        return resolve_hostintf(hostintf)
 
 
     def add_p2p(self, p2p):
@@ -245,71 +348,132 @@ class TcpBridge:
 
         left = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         right = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        tune_socket(left)
+        tune_socket(right)
 
-        # dict to map back to hostname & interface
-        self.socket2hostintf[left] = "%s/%s" % (src_router, src_interface)
-        self.socket2hostintf[right] = "%s/%s" % (dst_router, dst_interface)
+        # map back to hostname & interface and to the remote end of the pair,
+        # indexed by fileno
+        self._fd_set(left, right, "%s/%s" % (src_router, src_interface))
+        self._fd_set(right, left, "%s/%s" % (dst_router, dst_interface))
 
         try:
             left.connect(src)
         except:
-            self.logger.info("Unable to connect to %s" % self.socket2hostintf[left])
+            self.logger.info("Unable to connect to %s", self._hostintf[left.fileno()])
         try:
             right.connect(dst)
         except:
-            self.logger.info("Unable to connect to %s" % self.socket2hostintf[right])
+            self.logger.info("Unable to connect to %s", self._hostintf[right.fileno()])
 
         # add to list of sockets
         self.sockets.append(left)
         self.sockets.append(right)
 
-        # dict for looking up remote in pair
-        self.socket2remote[left] = right
-        self.socket2remote[right] = left
+        # register for edge-triggered epoll; work() drains each socket until
+        # EAGAIN so no events are lost
+        for sock in (left, right):
+            sock.setblocking(False)
+            self.fd2sock[sock.fileno()] = sock
+            self.epoll.register(sock.fileno(), select.EPOLLIN | select.EPOLLET)
+
+
+    def _fd_set(self, sock, remote, hostintf):
+        """ Record the pair remote and hostintf label for a socket, indexed
+            by its fileno
+        """
+        fd = sock.fileno()
+        if fd >= len(self._remote_sock):
+            self._remote_sock.extend([None] * (fd + 1 - len(self._remote_sock)))
+            self._hostintf.extend([None] * (fd + 1 - len(self._hostintf)))
+        self._remote_sock[fd] = remote
+        self._hostintf[fd] = hostintf
+
 
+    def reconnect(self, sock):
+        """ (Re)connect a socket to its configured endpoint
+        """
+        # temporarily go blocking so connect() completes or fails right here
+        # instead of raising EINPROGRESS
+        sock.setblocking(True)
+        try:
+            sock.connect(self.hostintf2addr(self._hostintf[sock.fileno()]))
+            self.logger.debug("connect to %s successful", self._hostintf[sock.fileno()])
+        except Exception as exc:
+            self.logger.warning("connect failed %s", exc)
+        finally:
+            sock.setblocking(False)
+
+
+    def sendmsg_all(self, sock, chunks):
+        """ Send every chunk completely, handling short sends
+
+            The relayed stream is qemu's length-prefixed netdev protocol, so
+            dropping even one byte mid-stream permanently desyncs the
+            receiver's framing. Flip the socket to blocking for the send so
+            the kernel applies backpressure like the original blocking
+            send() did, and resume after short sends (routine once the
+            peer's buffer is full) until everything is out.
+        """
+        sock.setblocking(True)
+        try:
+            while chunks:
+                # sendmsg fails with EMSGSIZE beyond IOV_MAX (1024 on
+                # Linux) iovecs, so feed it at most that many per call
+                sent = sock.sendmsg(chunks[:1024])
+                while sent > 0:
+                    if sent >= len(chunks[0]):
+                        sent -= len(chunks.pop(0))
+                    else:
+                        chunks[0] = chunks[0][sent:]
+                        sent = 0
+        finally:
+            sock.setblocking(False)
 
 
     def work(self):
         while True:
             try:
-                ir,_,_ = select.select(self.sockets, [], [])
-            except select.error as exc:
-                break
-
-            for i in ir:
-                remote = self.socket2remote[i]
-                try:
-                    buf = i.recv(2048)
-                except ConnectionResetError as exc:
-                    self.logger.warning("connection dropped, reconnecting to source %s" % self.socket2hostintf[i])
-                    try:
-                        i.connect(self.hostintf2addr(self.socket2hostintf[i]))
-                        self.logger.debug("reconnect to %s successful" % self.socket2hostintf[i])
-                    except Exception as exc:
-                        self.logger.warning("reconnect failed %s" % str(exc))
-                    continue
-                except OSError as exc:
-                    self.logger.warning("endpoint not connected, connecting to source %s" % self.socket2hostintf[i])
+                events = self.epoll.poll()
+            except InterruptedError:
+                continue
+
+            for fd, event in events:
+                i = self.fd2sock[fd]
+                remote = self._remote_sock[fd]
+                # edge-triggered, so drain the socket before the next poll;
+                # collect the chunks and hand them to the kernel in one
+                # scatter-gather send instead of one syscall per packet
+                chunks = []
+                while True:
+                    if len(chunks) == len(self._bufs):
+                        self._bufs.append(bytearray(2048))
+                    buf = self._bufs[len(chunks)]
                     try:
-                        i.connect(self.hostintf2addr(self.socket2hostintf[i]))
-                        self.logger.debug("connect to %s successful" % self.socket2hostintf[i])
-                    except:
-                        self.logger.warning("connect failed %s" % str(exc))
+                        n = i.recv_into(buf)
+                    except BlockingIOError:
+                        break
+                    except ConnectionResetError:
+                        self.logger.warning("connection dropped, reconnecting to source %s", self._hostintf[fd])
+                        self.reconnect(i)
+                        break
+                    except OSError:
+                        self.logger.warning("endpoint not connected, connecting to source %s", self._hostintf[fd])
+                        self.reconnect(i)
+                        break
+
+                    if n == 0:
+                        return
+                    chunks.append(memoryview(buf)[:n])
+
+                if not chunks:
                     continue
-
-                if len(buf) == 0:
-                    return
-                self.logger.debug("%05d bytes %s -> %s " % (len(buf), self.socket2hostintf[i], self.socket2hostintf[remote]))
+                total = sum(len(c) for c in chunks)
+                self.logger.debug("%05d bytes %s -> %s ", total, self._hostintf[fd], self._hostintf[remote.fileno()])
                 try:
-                    remote.send(buf)
+                    self.sendmsg_all(remote, chunks)
                 except BrokenPipeError:
-                    self.logger.warning("unable to send packet %05d bytes %s -> %s due to remote being down, trying reconnect" % (len(buf), self.socket2hostintf[i], self.socket2hostintf[remote]))
-                    try:
-                        remote.connect(self.hostintf2addr(self.socket2hostintf[remote]))
-                        self.logger.debug("connect to %s successful" % self.socket2hostintf[remote])
-                    except Exception as exc:
-                        self.logger.warning("connect failed %s" % str(exc))
-                    continue
+                    self.logger.warning("unable to send packet %05d bytes %s -> %s due to remote being down, trying reconnect", total, self._hostintf[fd], self._hostintf[remote.fileno()])
+                    self.reconnect(remote)
 
 
 class TcpHub:
@@ -321,14 +485,7 @@ class TcpHub:
     def ep2addr(self, hostintf):
         """ Return address based on endpoint
         """
-        hostname, interface = hostintf.split("/")
-
-        try:
-            res = socket.getaddrinfo(hostname, "100%02d" % int(interface), socket.AF_INET)
-        except socket.gaierror:
-            raise NoVR("Unable to resolve %s" % hostname)
-        sockaddr = res[0][4]
-        return sockaddr
+        return resolve_hostintf(hostintf)
 
 
     def add_ep(self, ep):
@@ -337,6 +494,7 @@ class TcpHub:
         remote = self.ep2addr(ep)
 
         s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        tune_socket(s)
 
         # dict to map back to hostname & interface
         self.socket2hostintf[s] = "%s/%s" % (host, interface)
@@ -344,7 +502,7 @@ class TcpHub:
         try:
             s.connect(remote)
         except:
-            self.logger.info("Unable to connect to %s" % self.socket2hostintf[remote])
+            self.logger.info("Unable to connect to %s", self.socket2hostintf[remote])
 
         # add to list of sockets
         self.sockets.append(s)
@@ -362,20 +520,20 @@ class TcpHub:
                 try:
                     buf = i.recv(2048)
                 except ConnectionResetError as exc:
-                    self.logger.warning("connection dropped, reconnecting to source %s" % self.socket2hostintf[i])
+                    self.logger.warning("connection dropped, reconnecting to source %s", self.socket2hostintf[i])
                     try:
                         i.connect(self.ep2addr(self.socket2hostintf[i]))
-                        self.logger.debug("reconnect to %s successful" % self.socket2hostintf[i])
+                        self.logger.debug("reconnect to %s successful", self.socket2hostintf[i])
                     except Exception as exc:
-                        self.logger.warning("reconnect failed %s" % str(exc))
+                        self.logger.warning("reconnect failed %s", exc)
                     continue
                 except OSError as exc:
-                    self.logger.warning("endpoint not connected, connecting to source %s" % self.socket2hostintf[i])
+                    self.logger.warning("endpoint not connected, connecting to source %s", self.socket2hostintf[i])
                     try:
                         i.connect(self.ep2addr(self.socket2hostintf[i]))
-                        self.logger.debug("connect to %s successful" % self.socket2hostintf[i])
+                        self.logger.debug("connect to %s successful", self.socket2hostintf[i])
                     except:
-                        self.logger.warning("connect failed %s" % str(exc))
+                        self.logger.warning("connect failed %s", exc)
                     continue
 
                 if len(buf) == 0:
@@ -383,7 +541,7 @@ class TcpHub:
 
                 # send to all other sockets
                 for remote in self.sockets:
-                    self.logger.debug("%05d bytes %s -> %s " % (len(buf), self.socket2hostintf[i], self.socket2hostintf[remote]))
+                    self.logger.debug("%05d bytes %s -> %s ", len(buf), self.socket2hostintf[i], self.socket2hostintf[remote])
                     # don't need to send to ourselves though
                     if i is remote:
                         continue
@@ -391,12 +549,12 @@ class TcpHub:
                     try:
                         remote.send(buf)
                     except BrokenPipeError:
-                        self.logger.warning("unable to send packet %05d bytes %s -> %s due to remote being down, trying reconnect" % (len(buf), self.socket2hostintf[i], self.socket2hostintf[remote]))
+                        self.logger.warning("unable to send packet %05d bytes %s -> %s due to remote being down, trying reconnect", len(buf), self.socket2hostintf[i], self.socket2hostintf[remote])
                         try:
                             remote.connect(self.ep2addr(self.socket2hostintf[remote]))
-                            self.logger.debug("connect to %s successful" % self.socket2hostintf[remote])
+                            self.logger.debug("connect to %s successful", self.socket2hostintf[remote])
                         except Exception as exc:
-                            self.logger.warning("connect failed %s" % str(exc))
+                            self.logger.warning("connect failed %s", exc)
                         continue
 
 
@@ -7,7 +7,6 @@ import random
 import re
 import signal
 import sys
-import telnetlib
 import time
 
 import vrnetlab
@@ -33,6 +32,22 @@ logging.Logger.trace = trace
 
 
 class XRV_vm(vrnetlab.VM):
+    # all boot prompts folded into one alternation compiled once at class
+    # scope; bootstrap_spin dispatches on which group matched instead of
+    # scanning five separate patterns on every spin
+    BOOT_RE = re.compile(b"(Press RETURN to get started)"
+                         b"|(SYSTEM CONFIGURATION COMPLETE)"
+                         b"|(Enter root-system username)"
+                         b"|(Username:)"
+                         b"|(^[^ ]+#)")
+
+    # crypto key generation prompts used by bootstrap_config, compiled once
+    # so expect() gets precompiled patterns instead of byte literals
+    KEY_PROMPTS = [re.compile(b"How many bits in the modulus"),
+                   re.compile(b"Do you really want to replace them"),
+                   re.compile(b"^[^ ]+#")]
+
+
     def __init__(self, username, password):
         disk_image = None
         for e in sorted(os.listdir("/")):
@@ -57,11 +72,9 @@ class XRV_vm(vrnetlab.VM):
             self.start()
             return
 
-        (ridx, match, res) = self.tn.expect([b"Press RETURN to get started",
-            b"SYSTEM CONFIGURATION COMPLETE",
-            b"Enter root-system username",
-            b"Username:", b"^[^ ]+#"], 1)
+        (_, match, res) = self.tn.expect([self.BOOT_RE], 1)
         if match: # got a match!
+            ridx = match.lastindex - 1
             if ridx == 0: # press return to get started, so we press return!
                 self.logger.debug("got 'press return to get started...'")
                 self.wait_write("", wait=None)
@@ -120,9 +133,7 @@ class XRV_vm(vrnetlab.VM):
 
         self.wait_write("crypto key generate rsa")
         # check if we are prompted to overwrite current keys
-        (ridx, match, res) = self.tn.expect([b"How many bits in the modulus",
-            b"Do you really want to replace them",
-            b"^[^ ]+#"], 10)
+        (ridx, match, res) = self.tn.expect(self.KEY_PROMPTS, 10)
         if match: # got a match!
             if ridx == 0:
                 self.wait_write("2048", None)